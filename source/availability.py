@@ -0,0 +1,174 @@
+"""Index of data availability for each instrument and variable, stored as
+sorted arrays of valid intervals"""
+import numpy as np
+import pandas as pd
+
+import reader
+
+AVAILABILITY_PATH = reader.REPODATA_PATH / "availability.npz"
+GAP_TOLERANCE = 1.5  # gaps longer than this many sample spacings split intervals
+
+MET_VARIABLES = ["temp_2m", "brightness_temp_surface"]
+
+
+def valid_intervals(df, spacing=None, gap_tolerance=GAP_TOLERANCE):
+    """Finds intervals of valid data for every column of df in one pass
+    :df: pandas.DataFrame with sorted DatetimeIndex
+    :spacing: nominal sample spacing as pandas.Timedelta, default is the
+              median spacing of the index
+    :gap_tolerance: time steps longer than gap_tolerance * spacing end an
+                    interval even if the samples either side are valid
+
+    Returns dict mapping column to (starts, ends) arrays of datetime64[ns].
+    Each valid sample is taken to cover one spacing.
+    """
+    t = df.index.values.astype("datetime64[ns]").view("int64")
+    if spacing is None:
+        spacing = int(np.median(np.diff(t))) if t.size > 1 else 0
+    else:
+        spacing = pd.Timedelta(spacing).value
+    gap = np.diff(t) > gap_tolerance * spacing
+
+    valid = np.isfinite(df.to_numpy(dtype=float))
+    pad = np.zeros((1, valid.shape[1]), dtype=bool)
+    prev_valid = (np.concatenate([pad, valid[:-1]]) &
+                  ~np.append(True, gap)[:, np.newaxis])
+    next_valid = (np.concatenate([valid[1:], pad]) &
+                  ~np.append(gap, True)[:, np.newaxis])
+
+    # Transposed nonzero returns row indices sorted by column then time
+    start_col, start_row = np.nonzero((valid & ~prev_valid).T)
+    end_col, end_row = np.nonzero((valid & ~next_valid).T)
+    bounds = np.searchsorted(start_col, np.arange(valid.shape[1] + 1))
+
+    index = {}
+    for icol, col in enumerate(df.columns):
+        rows = slice(bounds[icol], bounds[icol + 1])
+        index[col] = (t[start_row[rows]].view("datetime64[ns]"),
+                      (t[end_row[rows]] + spacing).view("datetime64[ns]"))
+    return index
+
+
+def _as_datetime64(time):
+    """Converts a time to numpy.datetime64[ns]"""
+    return np.datetime64(pd.Timestamp(time).to_datetime64(), "ns")
+
+
+def coverage(intervals, start, end):
+    """Returns fraction of the window [start, end) covered by intervals"""
+    starts, ends = intervals
+    start, end = _as_datetime64(start), _as_datetime64(end)
+    i0 = np.searchsorted(ends, start, side="right")
+    i1 = np.searchsorted(starts, end, side="left")
+    if i1 <= i0:
+        return 0.
+    covered = (np.minimum(ends[i0:i1], end) -
+               np.maximum(starts[i0:i1], start)).sum()
+    return covered / (end - start)
+
+
+def first_valid(intervals):
+    """Returns time of first valid sample or None"""
+    starts, _ = intervals
+    return pd.Timestamp(starts[0]) if starts.size else None
+
+
+def last_valid(intervals):
+    """Returns end time of last valid sample or None"""
+    _, ends = intervals
+    return pd.Timestamp(ends[-1]) if ends.size else None
+
+
+def common_coverage(*intervals):
+    """Returns intervals covered by all of the interval sets"""
+    starts = np.concatenate([s for s, _ in intervals])
+    ends = np.concatenate([e for _, e in intervals])
+    times = np.concatenate([starts, ends])
+    steps = np.concatenate([np.ones(starts.size, dtype=int),
+                            -np.ones(ends.size, dtype=int)])
+    # Ends sort before starts at the same time so touching intervals split
+    order = np.lexsort([steps, times])
+    times, depth = times[order], np.cumsum(steps[order])
+    inside = (depth[:-1] == len(intervals)) & (times[1:] > times[:-1])
+    return times[:-1][inside], times[1:][inside]
+
+
+def has_data(index, instrument, variable, start, end):
+    """Returns True if variable from instrument has any valid data in the
+    window [start, end)"""
+    return coverage(index[instrument][variable], start, end) > 0.
+
+
+def instrument_data():
+    """Loads each instrument and returns dict of DataFrames with one column
+    per variable"""
+    met = reader.metdata()
+    kazr = reader.kazrdata()
+    precip = reader.precipdata()
+    return {
+        "met": pd.concat([met[var].to_series() for var in MET_VARIABLES],
+                         axis=1),
+        "pluvio": precip[["bucket_rt"]].dropna(how="all"),
+        "parsivel": precip[["diameter_max"]].dropna(how="all"),
+        # A KAZR profile is valid if any range gate is valid
+        "kazr": kazr.mean_doppler_velocity.max(dim="range").to_dataframe()[
+            ["mean_doppler_velocity"]],
+        "kuka": reader.kukadata(),
+        "sbr": reader.sbrdata(),
+    }
+
+
+def build_index(data=None):
+    """Returns availability index as a dict mapping instrument to a dict of
+    intervals for each variable"""
+    if data is None: data = instrument_data()
+    return {instrument: valid_intervals(df.sort_index())
+            for instrument, df in data.items()}
+
+
+def save_index(index, path=AVAILABILITY_PATH):
+    """Saves availability index to a numpy npz file"""
+    arrays = {}
+    for instrument, variables in index.items():
+        for variable, (starts, ends) in variables.items():
+            arrays[f"{instrument}/{variable}/starts"] = starts
+            arrays[f"{instrument}/{variable}/ends"] = ends
+    np.savez(path, **arrays)
+
+
+def load_index(path=AVAILABILITY_PATH):
+    """Loads availability index saved by save_index"""
+    index = {}
+    with np.load(path) as npz:
+        for key in npz.files:
+            instrument, variable, bound = key.split("/")
+            bounds = index.setdefault(instrument, {}).setdefault(variable, {})
+            bounds[bound] = npz[key]
+    return {instrument: {variable: (bounds["starts"], bounds["ends"])
+                         for variable, bounds in variables.items()}
+            for instrument, variables in index.items()}
+
+
+def summary(index, start=reader.data_start_time, end=reader.data_end_time):
+    """Returns table of first and last valid time and coverage in window
+    for every instrument and variable"""
+    rows = [(instrument, variable,
+             first_valid(intervals), last_valid(intervals),
+             coverage(intervals, start, end))
+            for instrument, variables in index.items()
+            for variable, intervals in variables.items()]
+    return pd.DataFrame(rows, columns=["instrument", "variable", "first",
+                                       "last", "coverage"]).set_index(
+                                           ["instrument", "variable"])
+
+
+def main():
+    """Builds and saves the availability index"""
+    index = build_index()
+    save_index(index)
+    print(summary(index).to_string())
+    return index
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Detects step changes in KuKa backscatter and SBR brightness temperature
+using pruned exact linear time (PELT) segmentation of cumulative sums,
+with a bound on the number of candidate change points"""
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from matplotlib.gridspec import GridSpec
+
+import reader
+import plotting
+from plot_microwave import split_kuka, plot_ku, plot_ka, plot_sbr
+from plotting import RADAR_COLORS, SBR_COLORS, FIGURE_PATH
+
+PENALTY = 3.  # multiplies noise variance * log(n)
+MIN_SEGMENT = 3  # minimum number of samples in a segment
+MAX_CANDIDATES = 100  # bound on candidate change points kept by PELT
+NOISE_WINDOW = 25  # samples in running median used to estimate noise
+MAX_AUTOCORRELATION = 0.95
+CHANGEPOINT_MARKER = "v"
+CHANGEPOINT_MARKER_SIZE = 40
+
+
+def noise_variance(x, window=NOISE_WINDOW):
+    """Returns estimate of the variance of segment means due to noise.
+    Residuals from a running median, which follows step changes, give a
+    robust noise variance that is inflated by (1 + r) / (1 - r), where r is
+    the lag-1 autocorrelation of the residuals, so autocorrelated noise and
+    slow drift are not mistaken for steps.  Falls back to the residual
+    variance for heavily quantized series."""
+    series = pd.Series(x)
+    resid = (series - series.rolling(window, center=True,
+                                     min_periods=1).median()).to_numpy()
+    mad = np.median(np.abs(resid - np.median(resid)))
+    variance = (mad / 0.6745)**2 if mad > 0. else np.var(resid)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = np.corrcoef(resid[:-1], resid[1:])[0, 1]
+    r = np.clip(r, 0., MAX_AUTOCORRELATION) if np.isfinite(r) else 0.
+    return variance * (1. + r) / (1. - r)
+
+
+def pelt(x, penalty=PENALTY, min_segment=MIN_SEGMENT,
+         max_candidates=MAX_CANDIDATES):
+    """Returns sorted indices of change points in x that minimize the sum of
+    squared deviations from segment means plus penalty * noise variance *
+    log(n) for each change point.  Uses PELT (Killick et al., 2012), which
+    prunes candidate change points that can never be optimal.  Pruning alone
+    leaves O(n) candidates for series with few changes, so at most
+    max_candidates with the lowest cost are kept, bounding run time to
+    O(n * max_candidates).  The result is exact unless this bound is
+    reached.  The cost of the candidates is evaluated from cumulative sums
+    in one vectorized step.
+    :x: 1D array without missing values
+    :max_candidates: None for exact PELT
+    """
+    n = x.size
+    if n < 2 * min_segment:
+        return np.array([], dtype=int)
+    csum = np.concatenate([[0.], np.cumsum(x - x.mean())])
+    beta = penalty * noise_variance(x) * np.log(n)
+
+    # Sum of squares of a segment is sum(x**2) - sum(x)**2 / n, the first
+    # term is the same for every segmentation so only the second is kept
+    cost = np.full(n + 1, np.inf)
+    cost[0] = -beta
+    previous = np.zeros(n + 1, dtype=int)
+    candidates = np.array([0])
+    for t in range(min_segment, n + 1):
+        if t - min_segment >= min_segment:
+            candidates = np.append(candidates, t - min_segment)
+        segment_cost = (cost[candidates] -
+                        (csum[t] - csum[candidates])**2 / (t - candidates))
+        best = np.argmin(segment_cost)
+        cost[t] = segment_cost[best] + beta
+        previous[t] = candidates[best]
+        keep = segment_cost <= cost[t]
+        candidates, segment_cost = candidates[keep], segment_cost[keep]
+        if max_candidates and candidates.size > max_candidates:
+            candidates = candidates[np.argpartition(
+                segment_cost, max_candidates)[:max_candidates]]
+
+    changes = []
+    t = previous[n]
+    while t > 0:
+        changes.append(t)
+        t = previous[t]
+    return np.array(changes[::-1], dtype=int)
+
+
+def detect_changes(df, penalty=PENALTY, min_segment=MIN_SEGMENT):
+    """Detects step changes in every column of df
+    :df: pandas.DataFrame with time index and one column per channel
+    :penalty: larger values give fewer change points
+
+    Returns pandas.DataFrame with channel, time of change, mean level
+    before and after and magnitude of change
+    """
+    rows = []
+    for chan in df.columns:
+        series = df[chan].dropna()
+        x = series.to_numpy(dtype=float)
+        changes = pelt(x, penalty=penalty, min_segment=min_segment)
+        if changes.size == 0:
+            continue
+        bounds = np.concatenate([[0], changes, [x.size]])
+        csum = np.concatenate([[0.], np.cumsum(x)])
+        means = np.diff(csum[bounds]) / np.diff(bounds)
+        rows.append(pd.DataFrame({"channel": chan,
+                                  "time": series.index[changes],
+                                  "before": means[:-1],
+                                  "after": means[1:],
+                                  "magnitude": np.diff(means)}))
+    if not rows:
+        return pd.DataFrame(columns=["channel", "time", "before",
+                                     "after", "magnitude"])
+    return pd.concat(rows, ignore_index=True)
+
+
+def add_changepoints(changes, ax=None, colors=None):
+    """Adds change point markers at the level after each change
+    :changes: pandas.DataFrame returned by detect_changes
+    :colors: dict mapping channel to marker color
+    """
+    if not ax: ax = plt.gca()
+    if colors is None: colors = {}
+    for chan, chan_changes in changes.groupby("channel", sort=False):
+        ax.scatter(chan_changes.time.values, chan_changes.after.values,
+                   CHANGEPOINT_MARKER_SIZE,
+                   marker=CHANGEPOINT_MARKER,
+                   c=colors.get(chan, "k"),
+                   zorder=10)
+    return ax
+
+
+def plot_changepoints(df, changes, ax=None, fig_label=None, colors=None):
+    """Plots channels with change point markers
+    :df: pandas.DataFrame with time index and one column per channel
+    :changes: pandas.DataFrame returned by detect_changes
+    """
+    if not ax: ax = plt.gca()
+    plotting.add_panel(ax=ax, fig_label=fig_label)
+    if colors is None: colors = {}
+    for chan in df.columns:
+        ax.plot(df.index.values, df[chan].values,
+                color=colors.get(chan, "k"), label=chan)
+    add_changepoints(changes, ax=ax, colors=colors)
+    ax.legend(loc="lower left", ncol=2)
+    return ax
+
+
+def plot_microwave_changepoints():
+    """Detects and plots step changes in Ku, Ka and SBR channels"""
+    kuka = reader.kukadata()
+    sbr = reader.sbrdata()
+    ku_df = split_kuka(kuka, "Ku")
+    ka_df = split_kuka(kuka, "Ka")
+
+    ku_changes = detect_changes(ku_df)
+    ka_changes = detect_changes(ka_df)
+    sbr_changes = detect_changes(sbr)
+    print(pd.concat([ku_changes.assign(band="Ku"),
+                     ka_changes.assign(band="Ka"),
+                     sbr_changes.assign(band="SBR")]).to_string())
+
+    fig = plt.figure(figsize=(7, 9), constrained_layout=False)
+    gs = GridSpec(3, 1, figure=fig)
+    ax0 = fig.add_subplot(gs[0])
+    plot_ku(ku_df, ax=ax0, fig_label="a) Ku")
+    add_changepoints(ku_changes, ax=ax0,
+                     colors=dict(zip(ku_df.columns, RADAR_COLORS)))
+    ax0.set_xlabel('')
+
+    ax1 = fig.add_subplot(gs[1], sharex=ax0)
+    plot_ka(ka_df, ax=ax1, fig_label="b) Ka")
+    add_changepoints(ka_changes, ax=ax1,
+                     colors=dict(zip(ka_df.columns, RADAR_COLORS)))
+    ax1.set_xlabel('')
+
+    ax2 = fig.add_subplot(gs[2], sharex=ax0)
+    plot_sbr(sbr, ax=ax2, fig_label="c) SBR")
+    add_changepoints(sbr_changes, ax=ax2,
+                     colors=dict(zip(sbr.columns, SBR_COLORS)))
+    ax2.set_xlabel('September 2020')
+
+    report = plotting.save_figure(
+        fig, FIGURE_PATH / "mosaic_rain_on_snow_microwave_changepoints")
+    print(report.to_string())
+    return
+
+
+if __name__ == "__main__":
+    plot_microwave_changepoints()
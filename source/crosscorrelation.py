@@ -0,0 +1,198 @@
+"""Lagged cross-correlation and coherence between meteorological forcing and
+KuKa backscatter and SBR brightness temperature"""
+import numpy as np
+import pandas as pd
+from scipy import fft, signal
+import matplotlib.pyplot as plt
+
+import reader
+import plotting
+from plotting import XBEGIN, XEND, FIGURE_PATH
+from plot_snowdata_and_met import calc_precip_rate, clean_bucket
+
+MET_VARIABLES = ["temp_2m", "brightness_temp_surface"]
+DEFAULT_RESAMPLE = "1H"
+MAX_LAG = 48  # in resample periods
+MIN_OVERLAP = 24  # minimum number of paired samples for a valid lag
+COHERENCE_NPERSEG = 48
+
+FORCING_LINE_COLOR = "black"
+RESPONSE_LINE_COLOR = "tab:red"
+
+
+def forcing_data(resample=DEFAULT_RESAMPLE):
+    """Returns met tower temperatures and precipitation rate on a common
+    time grid
+    :resample: time period for resample
+    """
+    met = reader.metdata()
+    df = pd.concat([met[var].to_series() for var in MET_VARIABLES], axis=1)
+    precip_rate = calc_precip_rate(clean_bucket(reader.precipdata()))
+    df = pd.concat([df.resample(resample).mean(),
+                    precip_rate.resample(resample).mean()],
+                   axis=1)
+    return df[XBEGIN:XEND]
+
+
+def response_data(resample=DEFAULT_RESAMPLE):
+    """Returns KuKa and SBR channels on a common time grid
+    :resample: time period for resample
+    """
+    kuka = reader.kukadata().resample(resample).mean()
+    sbr = reader.sbrdata(resample=resample)
+    return kuka.join(sbr, how="outer")[XBEGIN:XEND]
+
+
+def _standardize(x):
+    """Returns x with zero mean and unit variance along the first axis,
+    ignoring NaN"""
+    return (x - np.nanmean(x, axis=0)) / np.nanstd(x, axis=0)
+
+
+def _cross_products(a, b, nfft):
+    """Returns sum(a[t] * b[t+k]) for every lag k and every pair of columns
+    of a and b from their real FFTs"""
+    return fft.irfft(np.conj(a)[:, :, np.newaxis] * b[:, np.newaxis, :],
+                     nfft, axis=0)
+
+
+def lagged_correlation(forcing, response, max_lag=MAX_LAG,
+                       min_overlap=MIN_OVERLAP):
+    """Calculates lagged Pearson correlation between every forcing and
+    response column in one batched FFT.  Missing values are excluded and
+    means and variances are calculated for the paired samples at each lag.
+    :forcing: pandas.DataFrame of forcing series
+    :response: pandas.DataFrame of response series on the same index
+    :max_lag: maximum lag in time steps
+    :min_overlap: lags with fewer paired samples are set to NaN
+
+    Returns pandas.DataFrame indexed by lag with (forcing, channel) columns.
+    Positive lags mean the response follows the forcing.
+    """
+    forcing, response = forcing.align(response, join="inner", axis=0)
+    # Standardizing first keeps the sums well conditioned
+    x = _standardize(forcing.to_numpy(dtype=float))
+    y = _standardize(response.to_numpy(dtype=float))
+    xmask, ymask = np.isfinite(x), np.isfinite(y)
+    x, y = np.where(xmask, x, 0.), np.where(ymask, y, 0.)
+
+    nfft = fft.next_fast_len(2 * x.shape[0] - 1, real=True)
+    lags = np.arange(-max_lag, max_lag + 1)
+
+    def rfft(a):
+        return fft.rfft(a.astype(float), nfft, axis=0)
+
+    def lagged_sum(a, b):
+        return _cross_products(a, b, nfft)[lags % nfft]
+
+    fx, fxx, fmx = rfft(x), rfft(x**2), rfft(xmask)
+    fy, fyy, fmy = rfft(y), rfft(y**2), rfft(ymask)
+    n = np.rint(lagged_sum(fmx, fmy))
+    sx, sxx = lagged_sum(fx, fmy), lagged_sum(fxx, fmy)
+    sy, syy = lagged_sum(fmx, fy), lagged_sum(fmx, fyy)
+    sxy = lagged_sum(fx, fy)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        covariance = sxy - sx * sy / n
+        variance = (sxx - sx**2 / n) * (syy - sy**2 / n)
+        corr = np.where((n >= min_overlap) & (variance > 0.),
+                        covariance / np.sqrt(variance), np.nan)
+    corr = np.clip(corr, -1., 1.)
+
+    columns = pd.MultiIndex.from_product([forcing.columns, response.columns],
+                                         names=["forcing", "channel"])
+    return pd.DataFrame(corr.reshape(lags.size, -1),
+                        index=pd.Index(lags, name="lag"),
+                        columns=columns)
+
+
+def peak_lags(table):
+    """Returns lag and correlation of the largest absolute correlation for
+    each (forcing, channel) pair in a lag table"""
+    values = table.to_numpy()
+    valid = np.isfinite(values).any(axis=0)
+    ipeak = np.nanargmax(np.where(np.isfinite(values), np.abs(values), -1.),
+                         axis=0)
+    peaks = pd.DataFrame({"lag": table.index.values[ipeak],
+                          "correlation": values[ipeak,
+                                                np.arange(values.shape[1])]},
+                         index=table.columns)
+    return peaks[valid]
+
+
+def coherence(forcing, response, nperseg=COHERENCE_NPERSEG):
+    """Calculates magnitude-squared coherence between every forcing and
+    response column.  Missing values are filled with the series mean.
+    :forcing: pandas.DataFrame of forcing series
+    :response: pandas.DataFrame of response series on the same index
+    :nperseg: length of each Welch segment in time steps
+
+    Returns pandas.DataFrame indexed by frequency (cycles per time step)
+    with (forcing, channel) columns
+    """
+    forcing, response = forcing.align(response, join="inner", axis=0)
+    x = np.nan_to_num(_standardize(forcing.to_numpy(dtype=float)))
+    y = np.nan_to_num(_standardize(response.to_numpy(dtype=float)))
+    freq, cxy = signal.coherence(x[:, :, np.newaxis], y[:, np.newaxis, :],
+                                 nperseg=min(nperseg, x.shape[0]), axis=0)
+    columns = pd.MultiIndex.from_product([forcing.columns, response.columns],
+                                         names=["forcing", "channel"])
+    return pd.DataFrame(cxy.reshape(freq.size, -1),
+                        index=pd.Index(freq, name="frequency"),
+                        columns=columns)
+
+
+def plot_lagged_response(forcing, response, lag, ax=None, fig_label=None):
+    """Plots standardized forcing and response shifted back by lag
+    :forcing: pandas.Series with forcing
+    :response: pandas.Series with response
+    :lag: lag in time steps
+    """
+    if not ax: ax = plt.gca()
+    plotting.add_panel(ax=ax, fig_label=fig_label)
+    ax.plot(forcing.index.values, _standardize(forcing.to_numpy(dtype=float)),
+            color=FORCING_LINE_COLOR, label=forcing.name)
+    ax.plot(response.index.values,
+            _standardize(response.shift(-lag).to_numpy(dtype=float)),
+            color=RESPONSE_LINE_COLOR, label=f"{response.name} (lag {lag})")
+    ax.set_ylabel("Standardized anomaly")
+    ax.legend(loc="lower left")
+    return ax
+
+
+def plot_crosscorrelation():
+    """Calculates lag tables and plots the best correlated channel for each
+    forcing.  Returns the lag table and the peak lag table."""
+    forcing = forcing_data()
+    response = response_data()
+
+    table = lagged_correlation(forcing, response)
+    peaks = peak_lags(table)
+
+    # peak_lags drops pairs without a valid lag, so forcings with no valid
+    # pair get no panel
+    forcings = [var for var in forcing.columns
+                if var in peaks.index.get_level_values("forcing")]
+    if not forcings:
+        print("No forcing has a valid lagged correlation")
+        return table, peaks
+
+    fig, ax = plt.subplots(len(forcings), 1, figsize=(7, 9),
+                           sharex=True, constrained_layout=True,
+                           squeeze=False)
+    ax = ax[:, 0]
+    for i, var in enumerate(forcings):
+        best = peaks.loc[var].correlation.abs().idxmax()
+        plot_lagged_response(forcing[var], response[best],
+                             int(peaks.loc[(var, best), "lag"]),
+                             ax=ax[i], fig_label=f"{chr(97+i)})")
+    ax[-1].set_xlabel("September 2020")
+
+    report = plotting.save_figure(
+        fig, FIGURE_PATH / "mosaic_rain_on_snow_lagged_correlation")
+    print(report.to_string())
+    return table, peaks
+
+
+if __name__ == "__main__":
+    plot_crosscorrelation()
@@ -0,0 +1,154 @@
+"""Derived meteorological variables calculated lazily from the flux tower data
+and cached to disk per met file and variable"""
+import hashlib
+import inspect
+import os
+import types
+
+import numpy as np
+import xarray as xr
+
+import reader
+
+DERIVED_PATH = reader.MET_DATAPATH / "derived"
+
+# Magnus formula coefficients over water (Alduchov and Eskridge, 1996)
+MAGNUS_B = 17.625
+MAGNUS_C = 243.04  # deg C
+
+# Bivariate logistic snow probability (Jennings et al., 2018)
+PHASE_ALPHA = -10.04
+PHASE_BETA = 1.41
+PHASE_GAMMA = 0.09
+
+
+def dew_point(ds):
+    """Returns 2 m dew point temperature (C) from Magnus formula"""
+    gamma = (np.log(ds.rh_2m / 100.) +
+             MAGNUS_B * ds.temp_2m / (MAGNUS_C + ds.temp_2m))
+    da = MAGNUS_C * gamma / (MAGNUS_B - gamma)
+    return da.assign_attrs(units="deg C", long_name="2 m dew point temperature")
+
+
+def wet_bulb(ds):
+    """Returns 2 m wet-bulb temperature (C) using Stull (2011)"""
+    t, rh = ds.temp_2m, ds.rh_2m
+    da = (t * np.arctan(0.151977 * np.sqrt(rh + 8.313659)) +
+          np.arctan(t + rh) - np.arctan(rh - 1.676331) +
+          0.00391838 * rh**1.5 * np.arctan(0.023101 * rh) -
+          4.686035)
+    return da.assign_attrs(units="deg C", long_name="2 m wet-bulb temperature")
+
+
+def rain_probability(ds):
+    """Returns probability that precipitation falls as rain from 2 m air
+    temperature and relative humidity"""
+    p_snow = 1. / (1. + np.exp(PHASE_ALPHA + PHASE_BETA * ds.temp_2m +
+                               PHASE_GAMMA * ds.rh_2m))
+    da = 1. - p_snow
+    return da.assign_attrs(units="1", long_name="Rain phase probability")
+
+
+def net_shortwave(ds):
+    """Returns net shortwave radiation (W/m2), positive downward"""
+    da = ds.down_short_hemisp - ds.up_short_hemisp
+    return da.assign_attrs(units="W m-2", long_name="Net shortwave radiation")
+
+
+def net_longwave(ds):
+    """Returns net longwave radiation (W/m2), positive downward"""
+    da = ds.down_long_hemisp - ds.up_long_hemisp
+    return da.assign_attrs(units="W m-2", long_name="Net longwave radiation")
+
+
+def net_radiation(ds):
+    """Returns net all-wave radiation (W/m2), positive downward"""
+    da = net_shortwave(ds) + net_longwave(ds)
+    return da.assign_attrs(units="W m-2", long_name="Net radiation")
+
+
+DERIVED_VARIABLES = {
+    "dew_point_2m": dew_point,
+    "wet_bulb_2m": wet_bulb,
+    "rain_probability": rain_probability,
+    "net_shortwave": net_shortwave,
+    "net_longwave": net_longwave,
+    "net_radiation": net_radiation,
+}
+
+
+def _formula_source(func, seen=None):
+    """Returns source of func followed by the values of the module constants
+    and the source of the module functions it refers to"""
+    if seen is None: seen = set()
+    seen.add(func.__name__)
+    parts = [inspect.getsource(func)]
+    for name in func.__code__.co_names:
+        value = globals().get(name)
+        if name in seen or value is None or isinstance(value, types.ModuleType):
+            continue
+        if isinstance(value, types.FunctionType):
+            parts.append(_formula_source(value, seen))
+        else:
+            seen.add(name)
+            parts.append(f"{name} = {value!r}")
+    return "\n".join(parts)
+
+
+def formula_tag(name):
+    """Returns short hash of the formula and coefficients of a derived
+    variable, which changes when either is edited"""
+    source = _formula_source(DERIVED_VARIABLES[name])
+    return hashlib.sha1(source.encode()).hexdigest()[:8]
+
+
+def cache_file(metfile, name, cache_path=DERIVED_PATH):
+    """Returns path to cache file for derived variable name from metfile.
+    The file name includes the formula tag so results from a different
+    formula are never reused."""
+    return cache_path / f"{metfile.stem}.{name}.{formula_tag(name)}.nc"
+
+
+def cached_variable(metfile, name, cache_path=DERIVED_PATH):
+    """Returns path to cached derived variable for one met file, calculating
+    it if the cache for the current formula is missing or older than the
+    met file"""
+    path = cache_file(metfile, name, cache_path=cache_path)
+    if not path.exists() or path.stat().st_mtime < metfile.stat().st_mtime:
+        cache_path.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file so an interrupted write is never
+        # mistaken for a valid cache
+        tmp_path = path.with_name(path.name + ".tmp")
+        with xr.open_dataset(metfile, chunks={}) as ds:
+            da = DERIVED_VARIABLES[name](ds).rename(name)
+            da = da.assign_attrs(formula_tag=formula_tag(name))
+            da.to_netcdf(tmp_path)
+        os.replace(tmp_path, path)
+    return path
+
+
+def derived_variable(name, metfiles=reader.metfile_path,
+                     cache_path=DERIVED_PATH):
+    """Returns lazily loaded derived variable for all met files
+    :name: name of variable in DERIVED_VARIABLES
+    :metfiles: list of met file paths
+    :cache_path: directory for cached variables
+    """
+    if name not in DERIVED_VARIABLES:
+        raise KeyError(f"Unknown derived variable {name}, expected one of "
+                       f"{', '.join(DERIVED_VARIABLES)}")
+    paths = [cached_variable(f, name, cache_path=cache_path) for f in metfiles]
+    ds = xr.open_mfdataset(paths, combine="by_coords")
+    return ds[name]
+
+
+def metdata_derived(names=None, metfiles=reader.metfile_path,
+                    cache_path=DERIVED_PATH):
+    """Returns meteorological tower data with derived variables added
+    :names: list of derived variables, default is all
+    """
+    if names is None: names = list(DERIVED_VARIABLES)
+    ds = xr.open_mfdataset(metfiles, combine="by_coords")
+    return ds.assign({name: derived_variable(name, metfiles=metfiles,
+                                             cache_path=cache_path)
+                      for name in names})
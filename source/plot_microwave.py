@@ -16,10 +16,12 @@ from plotting import (PRE_EVENT,
                       FIGURE_PATH)
 
 
-def plot_ku(df, ax=None, fig_label=None):
+def plot_ku(df, ax=None, fig_label=None, decimate=True, xlim=None):
     """Plots Ku radar channels"""
     if not ax: plt.gca()
     plotting.add_panel(ax=ax, fig_label=fig_label)
+    if xlim: ax.set_xlim(*xlim)
+    if decimate: df = plotting.decimate(df, ax=ax)
     df.plot(ax=ax, color=RADAR_COLORS, style=RADAR_LINESTYLES)
     ax.set_ylim(-35, 5)
     ax.set_ylabel("Backscatter (dB)")
@@ -28,10 +30,12 @@ def plot_ku(df, ax=None, fig_label=None):
     return ax
 
 
-def plot_ka(df, ax=None, fig_label=None):
+def plot_ka(df, ax=None, fig_label=None, decimate=True, xlim=None):
     """Plots Ka radar channels"""
     if not ax: plt.gca()
     plotting.add_panel(ax=ax, fig_label=fig_label)
+    if xlim: ax.set_xlim(*xlim)
+    if decimate: df = plotting.decimate(df, ax=ax)
     df.plot(ax=ax, color=RADAR_COLORS, style=RADAR_LINESTYLES)
     ax.set_ylim(-35, 5)
     ax.set_ylabel("Backscatter (dB)")
@@ -40,10 +44,12 @@ def plot_ka(df, ax=None, fig_label=None):
     return ax
 
 
-def plot_sbr(df, ax=None, fig_label=None):
+def plot_sbr(df, ax=None, fig_label=None, decimate=True, xlim=None):
     """Plots SBR Tb"""
     if not ax: plt.gca()
     plotting.add_panel(ax=ax, fig_label=fig_label)
+    if xlim: ax.set_xlim(*xlim)
+    if decimate: df = plotting.decimate(df, ax=ax)
     for chan, color, lines in zip(df.columns, SBR_COLORS, SBR_LINESTYLES):
         ax.plot(df.index.values, df[chan].values,
                 color=color, linestyle=lines,
@@ -136,7 +142,9 @@ def plot_microwave():
     fig.subplots_adjust(wspace=0.15)
     plt.show()
 
-    fig.savefig(FIGURE_PATH / "mosaic_rain_on_snow_microwave.png")
+    report = plotting.save_figure(fig,
+                                  FIGURE_PATH / "mosaic_rain_on_snow_microwave")
+    print(report.to_string())
     return
 
 
@@ -1,13 +1,13 @@
 """Makes a 3-panel figure showing radar Tb just around ROS event"""
 import datetime as dt
 
-import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from matplotlib.gridspec import GridSpec
 import seaborn as sns
 
 import reader
+import plotting
 from plot_microwave import split_kuka, plot_ka, plot_ku, plot_sbr, kd_plot
 from plotting import (PRE_EVENT,
                       POST_EVENT,
@@ -26,11 +26,7 @@ XEND = dt.datetime(2020,9,15)
 def plot_mosaic_microwave_closeup():
     """Plots closeup of microwave just around event"""
     kuka = reader.kukadata()
-    sbr = reader.sbrdata()
-
-    # 19 GHz values before 2020-09-09 11:00:00 may be affected by
-    # moving the antenna, so I set to NaN here
-    sbr.loc[:'2020-09-09 11', ['19V', '19H']] = np.nan
+    sbr = reader.mask_sbr19_antenna(reader.sbrdata())
 
     # For now, split Ku and Ka channels into separate Dataframes
     ku_df = split_kuka(kuka, "Ku")
@@ -43,21 +39,21 @@ def plot_mosaic_microwave_closeup():
 
     ax0 = fig.add_subplot(gs[0, :-2])
 #    ax0 = fig.add_subplot(3, 1, 1)
-    plot_ku(ku_df, ax=ax0, fig_label="a) Ku")
+    plot_ku(ku_df, ax=ax0, fig_label="a) Ku", xlim=(XBEGIN, XEND))
     ax0.tick_params(labelbottom=False)
     ax0.set_xlabel('')
     ax0.set_xlim(XBEGIN, XEND)
 
     ax1 = fig.add_subplot(gs[1, :-2], sharex=ax0)
 #    ax1 = fig.add_subplot(3, 1, 2)
-    plot_ka(ka_df, ax=ax1, fig_label="b) Ka")
+    plot_ka(ka_df, ax=ax1, fig_label="b) Ka", xlim=(XBEGIN, XEND))
     ax1.tick_params(labelbottom=False)
     ax1.set_xlabel('')
     ax1.set_xlim(XBEGIN, XEND)
 
     ax2 = fig.add_subplot(gs[2, :-2], sharex=ax0)
 #    ax2 = fig.add_subplot(3, 1, 3)
-    plot_sbr(sbr, ax=ax2, fig_label="c) SBR")
+    plot_sbr(sbr, ax=ax2, fig_label="c) SBR", xlim=(XBEGIN, XEND))
     ax2.set_xlabel('September 2020')
     ax2.set_xlim(XBEGIN, XEND)
     ax2.xaxis.set_major_formatter(datefmt)
@@ -144,7 +140,9 @@ def plot_mosaic_microwave_closeup():
     fig.subplots_adjust(wspace=0.25)
 
 #    plt.show()
-    fig.savefig(FIGURE_PATH / "mosaic_rain_on_snow_microwave.closeup.png")
+    report = plotting.save_figure(
+        fig, FIGURE_PATH / "mosaic_rain_on_snow_microwave.closeup")
+    print(report.to_string())
 
     return
 
@@ -88,7 +88,18 @@ def mscatter(df, column, ax=None, color='k', size=1,
     return ax
 
 
-def plot_meteorological_data(metdata, ax=None, fig_label=None):
+def met_series(metdata, variables, ax=None, decimate=True):
+    """Returns met variables as a pandas.DataFrame, decimated to the
+    resolution of ax
+    :metdata: xarray.Dataset containing meteorological tower data
+    :variables: list of variable names
+    """
+    df = metdata[variables].to_dataframe()[variables]
+    if decimate: df = plotting.decimate(df, ax=ax)
+    return df
+
+
+def plot_meteorological_data(metdata, ax=None, fig_label=None, decimate=True):
     """Creates panel with meteorological data
     :metdata: xarray.DataFrame containing meteorological tower data
 
@@ -97,7 +108,9 @@ def plot_meteorological_data(metdata, ax=None, fig_label=None):
     tair_min_limit = -20.
     tair_max_limit = 3.
     ax = plotting.add_panel(ax, fig_label)
-    metdata.temp_2m.plot(ax=ax, color=DEFAULT_DATA_LINE_COLOR, lw=2)
+    df = met_series(metdata, ["temp_2m"], ax=ax, decimate=decimate)
+    ax.plot(df.index.values, df.temp_2m.values,
+            color=DEFAULT_DATA_LINE_COLOR, lw=2)
     ax.axhline(0., c=DEFAULT_ZERO_LINE_COLOR)
     ax.set_ylim(tair_min_limit, tair_max_limit)
     ax.set_xlabel('')
@@ -105,7 +118,8 @@ def plot_meteorological_data(metdata, ax=None, fig_label=None):
     return ax
 
 
-def plot_snow_temperature(metdata, snowdata, ax=None, fig_label=None):
+def plot_snow_temperature(metdata, snowdata, ax=None, fig_label=None,
+                          decimate=True):
     """Creates panel with snow temperature data
     :metdata: xarray.DataSet with meteorological data
     :snowdata: pandas.DataFrame with snow data
@@ -115,14 +129,18 @@ def plot_snow_temperature(metdata, snowdata, ax=None, fig_label=None):
     ax = plotting.add_panel(ax, fig_label)
     ax.axhline(0., c=DEFAULT_ZERO_LINE_COLOR)
     ax.set_ylim(-20, 3)
-    metdata.brightness_temp_surface.plot(
-        ax=ax,
+    df = met_series(metdata, ["brightness_temp_surface", "temp_2m"],
+                    ax=ax, decimate=decimate)
+    ax.plot(
+        df.index.values,
+        df.brightness_temp_surface.values,
         color='c',
         lw=2,
         label='Snow surface temperature'
     )
-    metdata.temp_2m.plot(
-        ax=ax,
+    ax.plot(
+        df.index.values,
+        df.temp_2m.values,
         color=DEFAULT_DATA_LINE_COLOR,
         lw=2,
         label='2 m Air Temperature',
@@ -184,6 +202,15 @@ def plot_snow_density(snowdata, ax=None, fig_label=None,
     return ax
 
 
+def clean_bucket(precipdata):
+    """Returns a copy of precipdata with bucket_rt offset by the first valid
+    reading and negative values, when the bucket is emptied, set to NaN"""
+    precipdata = precipdata.copy()
+    bucket = precipdata.bucket_rt - precipdata.bucket_rt.dropna().iloc[0]
+    precipdata['bucket_rt'] = bucket.where(bucket >= 0)
+    return precipdata
+
+
 def calc_precip_rate(bucketdata):
     """Calculate precipitation rate from bucket data"""
     hourly_range = pd.date_range(bucketdata.index[0],
@@ -221,9 +248,7 @@ def plot_precip_vars(precipdata, ax=None, fig_label=None):
 
     :ax: matplotlib.Axes
     """
-    precipdata['bucket_rt'] = precipdata['bucket_rt'] - \
-        precipdata.bucket_rt[precipdata.bucket_rt.isna() == False][0]
-    precipdata['bucket_rt'][precipdata['bucket_rt'] < 0] = np.nan
+    precipdata = clean_bucket(precipdata)
     precipdata = pd.concat([precipdata, calc_precip_rate(precipdata.copy())],
                            axis=1)
     precipdata = precipdata.to_xarray()
@@ -374,7 +399,9 @@ def plot_snowdata_and_met():
     ax[4].xaxis.set_major_formatter(date_form)
 
     fig.set_constrained_layout_pads(h_pad=0.01)
-    fig.savefig(FIGURE_PATH / "mosaic_rain_on_snow_figure01.png")
+    report = plotting.save_figure(fig,
+                                  FIGURE_PATH / "mosaic_rain_on_snow_figure01")
+    print(report.to_string())
 
 
 if __name__ == "__main__":
@@ -1,8 +1,13 @@
 """Common plotting routines"""
 from pathlib import Path
+import time
 
 import datetime as dt
+import numpy as np
+import pandas as pd
 import matplotlib.dates as mdates
+from matplotlib.collections import PolyCollection, QuadMesh
+from matplotlib.lines import Line2D
 
 FIGURE_PATH = Path.home() / 'src' / 'mosaic_rain_on_snow' / 'figures'
 
@@ -56,6 +61,15 @@ SBR_SHADE = [True,
 PRE_EVENT = TAIR_ABOVE_ZERO[0]
 POST_EVENT = TAIR_ABOVE_ZERO[1]
 
+DECIMATE_OVERSAMPLE = 2  # time buckets per axis pixel
+
+EXPORT_FORMATS = ["png", "pdf", "svg"]
+EXPORT_DPI = {"png": "figure",  # dpi for each format, sets resolution of
+              "pdf": 300,       # rasterized layers in vector formats
+              "svg": 300}
+VECTOR_FORMATS = ["pdf", "svg", "eps", "ps"]
+RASTERIZE_MIN_VERTICES = 2000  # lines with more vertices are rasterized
+
 
 def add_fig_label(label, ax):
     ax.text(0.01, 0.98, label,
@@ -85,3 +99,123 @@ def add_panel(ax, fig_label):
     if fig_label: add_fig_label(fig_label, ax)
 
     return ax
+
+
+def decimate(df, ax=None, npixels=None, oversample=DECIMATE_OVERSAMPLE):
+    """Reduces each column of a time series DataFrame to its minimum and
+    maximum in time buckets the width of an axis pixel.  Extremes are kept
+    in the order they occur, so the drawn line looks the same as the full
+    series at the axis resolution.
+    :df: pandas.DataFrame with sorted DatetimeIndex
+    :ax: matplotlib.Axes the data will be drawn on, x-axis limits and
+         width are used to set the bucket size
+    :npixels: axis width in pixels, default is width of ax
+    :oversample: number of buckets per pixel
+
+    Returns df if it is already smaller than twice the number of buckets
+    """
+    if npixels is None:
+        if not ax: return df
+        npixels = ax.bbox.width
+    if len(df) < 2:
+        return df
+
+    t = df.index.values.astype("datetime64[ns]").view("int64")
+    span = t[-1] - t[0] + 1
+    nbucket = npixels * oversample
+    if ax:
+        xmin, xmax = ax.get_xlim()
+        view_span = (xmax - xmin) * pd.Timedelta(days=1).value
+        nbucket = nbucket * max(span / view_span, 1.)
+    nbucket = int(nbucket)
+    if len(df) <= 2 * nbucket:
+        return df
+
+    bucket = (t - t[0]) * nbucket // span
+    starts = np.flatnonzero(np.diff(bucket, prepend=-1))
+    ends = np.append(starts[1:], len(t))
+
+    values = df.to_numpy(dtype=float)
+    vmin = np.fmin.reduceat(values, starts, axis=0)
+    vmax = np.fmax.reduceat(values, starts, axis=0)
+
+    # Position of first minimum and maximum in each bucket sets the order
+    ibucket = np.repeat(np.arange(starts.size), ends - starts)
+    position = np.arange(len(t))[:, np.newaxis]
+    imin = np.minimum.reduceat(
+        np.where(values == vmin[ibucket], position, len(t)), starts, axis=0)
+    imax = np.minimum.reduceat(
+        np.where(values == vmax[ibucket], position, len(t)), starts, axis=0)
+    min_first = imin <= imax
+
+    decimated = np.empty((2 * starts.size, values.shape[1]))
+    decimated[0::2] = np.where(min_first, vmin, vmax)
+    decimated[1::2] = np.where(min_first, vmax, vmin)
+    times = np.empty(2 * starts.size, dtype=df.index.values.dtype)
+    times[0::2] = df.index.values[starts]
+    times[1::2] = df.index.values[ends - 1]
+
+    return pd.DataFrame(decimated,
+                        index=pd.DatetimeIndex(times, name=df.index.name),
+                        columns=df.columns)
+
+
+def heavy_artists(fig, min_vertices=RASTERIZE_MIN_VERTICES):
+    """Returns artists that are slow to write and large in vector formats:
+    meshes, filled polygons such as KDE shading and dense lines"""
+    artists = []
+    for ax in fig.axes:
+        for artist in ax.get_children():
+            if isinstance(artist, (QuadMesh, PolyCollection)):
+                artists.append(artist)
+            elif (isinstance(artist, Line2D) and
+                  len(artist.get_xdata()) >= min_vertices):
+                artists.append(artist)
+    return artists
+
+
+def save_figure(fig, path, formats=EXPORT_FORMATS, dpi=EXPORT_DPI,
+                rasterize=True):
+    """Saves a figure in several formats.  Heavy artists are rasterized in
+    vector formats.  The figure is drawn once before export to resolve the
+    layout, and the layout engine is switched off while each format is
+    written, so constrained or tight layout runs once rather than once per
+    format.  Each format's writer still draws the figure, after a pass
+    without rendering that savefig makes for any figure that has had a
+    layout engine.
+    :fig: matplotlib.Figure
+    :path: path of output file without format suffix
+    :formats: list of formats
+    :dpi: dpi for all formats or dict of dpi for each format
+    :rasterize: rasterize heavy artists in vector formats
+
+    Returns pandas.DataFrame with file, dpi, time and size for each format
+    """
+    heavy = heavy_artists(fig) if rasterize else []
+    was_rasterized = [artist.get_rasterized() for artist in heavy]
+
+    fig.canvas.draw()
+    layout_engine = fig.get_layout_engine()
+    fig.set_layout_engine("none")
+
+    report = []
+    try:
+        for fmt in formats:
+            for artist, rasterized in zip(heavy, was_rasterized):
+                artist.set_rasterized(rasterized or fmt in VECTOR_FORMATS)
+            fmt_dpi = dpi.get(fmt, "figure") if isinstance(dpi, dict) else dpi
+            filename = Path(f"{path}.{fmt}")
+            start = time.perf_counter()
+            fig.savefig(filename, format=fmt, dpi=fmt_dpi)
+            elapsed = time.perf_counter() - start
+            report.append((fmt, filename, fmt_dpi, elapsed,
+                           filename.stat().st_size / 1e6))
+    finally:
+        fig.set_layout_engine(layout_engine)
+        for artist, rasterized in zip(heavy, was_rasterized):
+            artist.set_rasterized(rasterized)
+
+    report = pd.DataFrame(report, columns=["format", "file", "dpi",
+                                           "time (s)", "size (MB)"])
+    report = report.set_index("format")
+    return report
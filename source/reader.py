@@ -2,9 +2,12 @@
 
 from pathlib import Path
 
+import numpy as np
 import xarray as xr
 import pandas as pd
 
+import sbrstore
+
 from plotting import XBEGIN as data_start_time
 from plotting import XEND as data_end_time
 
@@ -30,10 +33,14 @@ SNOWSALINITY_PATH = REPODATA_PATH / "mosaic_ros_snow_updated.csv"
 SNOWDATA_PATH = REPODATA_PATH / "Snow_RoS.csv"
 KUKA_PATH = REPODATA_PATH / "KuKa_RoS_corrected_KuKaPy.csv"
 SBR_PATH = REPODATA_PATH
+SBR_STORE_PATH = REPODATA_PATH / "sbr_store"
 PLUVIO_PATH = REPODATA_PATH / "pluvio_ds_2020-09-09 00:00:00_2020-09-20 00:00:00.nc"
 KAZR_PATH = REPODATA_PATH / "kazr_ds_2020-09-09 00:00:00_2020-09-20 00:00:00.nc"
 PARSIVEL_PATH = REPODATA_PATH / "parsivel_ds_2020-09-09 00:00:00_2020-09-20 00:00:00.nc"
 
+# 19 GHz SBR values up to this hour may be affected by moving the antenna
+SBR19_ANTENNA_MOVED = "2020-09-09 11"
+
 
 def kazrdata():
     """Loads Ka-band zenith radar vertical velocity"""
@@ -82,30 +89,32 @@ def kukadata():
     return df
 
 
-def onesbr(frequency, resample="1H"):
-    """Reads one of the SBR files and returns Tb for angle = 55
+def onesbr(frequency, resample="1H", angle=55, legs=(5,)):
+    """Reads one SBR frequency from the SBR array store and returns Tb.
+    The store is rebuilt from the calibrated files if it does not exist or
+    the files have changed.
     :frequency: frequency of data (19 or 89 GHz)
     :resample: time period for resample
+    :angle: incidence angle
+    :legs: list of legs, None for all legs
     """
-    if frequency == "19":
-        usecols = [0, 1, 4, 21, 22]
-    else:
-        usecols = [0, 1, 4, 22, 23]
-    df = pd.read_csv(SBR_PATH / f"tb{frequency}_leg5_calibrated.txt",
-                     index_col="Date",
-                     parse_dates={"Date": [0, 1]},
-                     delim_whitespace=True,
-                     header=None,
-                     usecols=usecols)
-    df.columns = ["angle", f"{frequency}H", f"{frequency}V"]
-    df = df[df.angle == 55]
-    df = df.drop("angle", axis=1)
+    if sbrstore.is_stale(SBR_PATH, SBR_STORE_PATH):
+        sbrstore.convert(SBR_PATH, SBR_STORE_PATH)
+    df = sbrstore.select(SBR_STORE_PATH, frequency, angle=angle, legs=legs)
     df = df.resample(resample).mean()
     return df
 
 
-def sbrdata(resample="1H"):
+def sbrdata(resample="1H", angle=55, legs=(5,)):
     """Load SBR files and join into one DataFrame"""
-    df19 = onesbr("19", resample=resample)
-    df89 = onesbr("89", resample=resample)
+    df19 = onesbr("19", resample=resample, angle=angle, legs=legs)
+    df89 = onesbr("89", resample=resample, angle=angle, legs=legs)
     return df19.join(df89)
+
+
+def mask_sbr19_antenna(sbr):
+    """Returns a copy of SBR Tb with 19 GHz values up to
+    SBR19_ANTENNA_MOVED set to NaN"""
+    sbr = sbr.copy()
+    sbr.loc[:SBR19_ANTENNA_MOVED, ['19V', '19H']] = np.nan
+    return sbr
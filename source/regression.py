@@ -0,0 +1,236 @@
+"""Regression checks for figures and derived arrays.
+
+Compares derived arrays (precipitation rate, KDE curves, resampled SBR,
+snowpit bulk properties) and rendered figures against stored baselines,
+and checks each figure against time and peak memory budgets.
+
+    python regression.py            # check against baselines
+    python regression.py --update   # write new baselines
+"""
+import argparse
+from pathlib import Path
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.stats import gaussian_kde
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from matplotlib.testing.compare import compare_images
+
+import reader
+import snowpit
+import plot_microwave
+import plot_mosaic_microwave_closeup
+import plot_snowdata_and_met
+from plot_microwave import split_kuka
+from plot_snowdata_and_met import calc_precip_rate, clean_bucket
+from plotting import FIGURE_PATH
+
+BASELINE_PATH = reader.REPODATA_PATH / "regression_baselines.npz"
+
+ARRAY_RTOL = 1e-6
+ARRAY_ATOL = 1e-8
+IMAGE_TOLERANCE = 2.  # RMS difference in pixel values, 0-255
+
+KDE_GRIDS = {
+    "ku": np.linspace(-35., 5., 201),
+    "ka": np.linspace(-35., 5., 201),
+    "sbr": np.linspace(100., 300., 201),
+}
+
+# Figure function, module holding FIGURE_PATH, output name, time budget (s)
+# and budget for peak resident memory of a process running the figure (MB)
+FIGURES = {
+    "figure01": (plot_snowdata_and_met.plot_snowdata_and_met,
+                 plot_snowdata_and_met,
+                 "mosaic_rain_on_snow_figure01", 60., 2000.),
+    "microwave": (plot_microwave.plot_microwave,
+                  plot_microwave,
+                  "mosaic_rain_on_snow_microwave", 30., 1000.),
+    "microwave_closeup": (plot_mosaic_microwave_closeup.plot_mosaic_microwave_closeup,
+                          plot_mosaic_microwave_closeup,
+                          "mosaic_rain_on_snow_microwave.closeup", 30., 1000.),
+}
+
+
+def kde_curves(df, grid):
+    """Returns Gaussian KDE of each column of df evaluated on grid, with
+    the same default bandwidth as seaborn.kdeplot"""
+    curves = []
+    for col in df.columns:
+        values = df[col].dropna().to_numpy(dtype=float)
+        curves.append(gaussian_kde(values)(grid) if values.size > 1
+                      else np.full(grid.size, np.nan))
+    return np.stack(curves)
+
+
+def derived_arrays():
+    """Calculates derived arrays used in the figures"""
+    kuka = reader.kukadata()
+    sbr = reader.sbrdata()
+    ku_df = split_kuka(kuka, "Ku")
+    ka_df = split_kuka(kuka, "Ka")
+    precip_rate = calc_precip_rate(clean_bucket(reader.precipdata()))
+    bulk = snowpit.aggregate_pits(pd.read_csv(
+        reader.REPODATA_PATH /
+        "MOSAiC_ROSevent_12to15092020_PitsOnly_Density_Salinity_updated.csv"))
+    return {
+        "precip_rate": precip_rate.precip_rate.to_numpy(dtype=float),
+        "precip_rate_time": precip_rate.index.values.astype("int64"),
+        "sbr": sbr.to_numpy(dtype=float),
+        "sbr_time": sbr.index.values.astype("int64"),
+        "kde_ku": kde_curves(ku_df, KDE_GRIDS["ku"]),
+        "kde_ka": kde_curves(ka_df, KDE_GRIDS["ka"]),
+        "kde_sbr": kde_curves(sbr, KDE_GRIDS["sbr"]),
+        "snowpit_bulk": bulk.drop(columns="Location").to_numpy(dtype=float),
+    }
+
+
+def check_arrays(update=False, baseline_path=BASELINE_PATH):
+    """Compares derived arrays with baselines, or writes baselines if
+    update is True.  Returns list of (check, passed, message)."""
+    arrays = derived_arrays()
+    if update:
+        np.savez(baseline_path, **arrays)
+        return [(f"array {name}", True, "baseline updated") for name in arrays]
+
+    if not baseline_path.exists():
+        return [(f"array {name}", False,
+                 f"no baseline file {baseline_path}, run with --update")
+                for name in arrays]
+
+    results = []
+    with np.load(baseline_path) as baseline:
+        for name, actual in arrays.items():
+            if name not in baseline.files:
+                results.append((f"array {name}", False,
+                                "no baseline, run with --update"))
+                continue
+            expected = baseline[name]
+            if actual.shape != expected.shape:
+                results.append((f"array {name}", False,
+                                f"shape {actual.shape} != {expected.shape}"))
+                continue
+            close = np.isclose(actual, expected, rtol=ARRAY_RTOL,
+                               atol=ARRAY_ATOL, equal_nan=True)
+            results.append((f"array {name}", bool(close.all()),
+                            f"{(~close).sum()} of {close.size} values differ"))
+    return results
+
+
+def run_figure(func, module, name, outdir):
+    """Runs a figure function with output redirected to outdir.  Returns
+    path of PNG and elapsed time (s)."""
+    figure_path = module.FIGURE_PATH
+    module.FIGURE_PATH = outdir
+    start = time.perf_counter()
+    try:
+        func()
+    finally:
+        elapsed = time.perf_counter() - start
+        module.FIGURE_PATH = figure_path
+        plt.close("all")
+    return outdir / f"{name}.png", elapsed
+
+
+def peak_rss():
+    """Returns peak resident memory of this process in MB"""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return maxrss / 1e6 if sys.platform == "darwin" else maxrss / 1e3
+
+
+def measure_memory(key, outdir):
+    """Runs one figure in a new process and returns its peak resident
+    memory in MB.  This includes memory allocated by C libraries such as
+    netCDF/HDF5 and the Agg renderer."""
+    proc = subprocess.run([sys.executable, __file__, "--memory-child", key,
+                           str(outdir)],
+                          capture_output=True, text=True, check=True)
+    return float(proc.stdout.strip().splitlines()[-1])
+
+
+def check_figures(update=False, figure_path=FIGURE_PATH):
+    """Renders each figure and compares with baseline images and budgets,
+    or copies rendered images to figure_path if update is True.  Returns
+    list of (check, passed, message)."""
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for key, (func, module, name, time_budget, memory_budget) in FIGURES.items():
+            # Time and memory are measured in separate runs so neither
+            # measurement affects the other
+            try:
+                png, elapsed = run_figure(func, module, name, Path(tmpdir))
+            except Exception as err:
+                # The memory run would fail the same way, so it is skipped
+                message = f"figure failed: {type(err).__name__}: {err}"
+                for check in ["time", "memory", "image"]:
+                    results.append((f"{key} {check}", False, message))
+                continue
+            try:
+                peak = measure_memory(key, Path(tmpdir))
+            except subprocess.CalledProcessError as err:
+                results.append((f"{key} memory", False,
+                                f"figure failed: {err.stderr.strip()}"))
+                peak = None
+            results.append((f"{key} time", elapsed <= time_budget,
+                            f"{elapsed:.1f} s (budget {time_budget:.0f} s)"))
+            if peak is not None:
+                results.append((f"{key} memory", peak <= memory_budget,
+                                f"{peak:.0f} MB (budget {memory_budget:.0f} MB)"))
+
+            expected = figure_path / f"{name}.png"
+            if update:
+                shutil.copyfile(png, expected)
+                results.append((f"{key} image", True, "baseline updated"))
+                continue
+            if not expected.exists():
+                results.append((f"{key} image", False,
+                                f"no baseline image {expected}, run with --update"))
+                continue
+            try:
+                failure = compare_images(str(expected), str(png),
+                                         tol=IMAGE_TOLERANCE)
+            except Exception as err:
+                failure = str(err)
+            results.append((f"{key} image", failure is None,
+                            failure or "matches baseline"))
+    return results
+
+
+def main(argv=None):
+    """Runs regression checks and returns exit status"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--update", action="store_true",
+                        help="write new baselines instead of checking")
+    parser.add_argument("--skip-figures", action="store_true",
+                        help="only check derived arrays")
+    parser.add_argument("--memory-child", nargs=2, metavar=("FIGURE", "OUTDIR"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.memory_child:
+        key, outdir = args.memory_child
+        func, module, name, _, _ = FIGURES[key]
+        run_figure(func, module, name, Path(outdir))
+        print(peak_rss())
+        return 0
+
+    results = check_arrays(update=args.update)
+    if not args.skip_figures:
+        results += check_figures(update=args.update)
+
+    report = pd.DataFrame(results, columns=["check", "passed", "message"])
+    print(report.to_string(index=False))
+    return 0 if report.passed.all() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Local HTTP server that renders figure panels for a requested time window
+as PNG.  Data are loaded once and kept in memory, and rendered panels are
+kept in an LRU cache.
+
+Request panels as
+    http://localhost:8050/panel/<name>.png?start=2020-09-12&end=2020-09-15&style=default
+"""
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import threading
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+import reader
+from plotting import (XBEGIN,
+                      XEND,
+                      RADAR_COLORS,
+                      RADAR_LINESTYLES,
+                      RADAR_SHADE,
+                      SBR_COLORS,
+                      SBR_LINESTYLES,
+                      SBR_SHADE)
+from plot_microwave import split_kuka, plot_ku, plot_ka, plot_sbr, kd_plot
+from plot_snowdata_and_met import (plot_meteorological_data,
+                                   plot_snow_temperature,
+                                   plot_precip_vars,
+                                   plot_fall_speed,
+                                   plot_snow_density,
+                                   plot_swe)
+
+HOST = "localhost"
+PORT = 8050
+RENDER_CACHE_SIZE = 256
+PANEL_FIGSIZE = (7, 2.5)
+KDE_FIGSIZE = (2, 2.5)
+DEFAULT_STYLE = "default"
+
+# pyplot state and style contexts are not thread safe
+RENDER_LOCK = threading.Lock()
+DATA = {}
+
+
+def load_data():
+    """Loads all datasets into memory"""
+    kuka = reader.kukadata()
+    DATA.update({
+        "met": reader.metdata().load(),
+        "snow": reader.snowdata(),
+        "precip": reader.precipdata(),
+        "kazr": reader.kazrdata().load(),
+        "ku": split_kuka(kuka, "Ku"),
+        "ka": split_kuka(kuka, "Ka"),
+        "sbr": reader.sbrdata(),
+    })
+    return DATA
+
+
+def window(data, start, end):
+    """Returns pandas or xarray data between start and end"""
+    if isinstance(data, pd.DataFrame):
+        return data[start:end]
+    return data.sel(time=slice(start, end))
+
+
+# Each panel takes data, axes and window.  Snow pit data are not windowed
+# because site markers are assigned by row.
+PANELS = {
+    "meteorological_data": lambda data, ax, start, end: plot_meteorological_data(
+        window(data["met"], start, end), ax=ax),
+    "snow_temperature": lambda data, ax, start, end: plot_snow_temperature(
+        window(data["met"], start, end), data["snow"], ax=ax),
+    "precip_vars": lambda data, ax, start, end: plot_precip_vars(
+        window(data["precip"], start, end).copy(), ax=ax),
+    "fall_speed": lambda data, ax, start, end: plot_fall_speed(
+        window(data["kazr"], start, end).copy(), ax=ax),
+    "snow_density": lambda data, ax, start, end: plot_snow_density(
+        data["snow"], ax=ax),
+    "swe": lambda data, ax, start, end: plot_swe(data["snow"], ax=ax),
+    "ku": lambda data, ax, start, end: plot_ku(
+        window(data["ku"], start, end), ax=ax),
+    "ka": lambda data, ax, start, end: plot_ka(
+        window(data["ka"], start, end), ax=ax),
+    "sbr": lambda data, ax, start, end: plot_sbr(
+        window(data["sbr"], start, end), ax=ax),
+    "kd_ku": lambda data, ax, start, end: kd_plot(
+        window(data["ku"], start, end), data["ku"].columns,
+        RADAR_COLORS, RADAR_SHADE, RADAR_LINESTYLES, ax=ax),
+    "kd_ka": lambda data, ax, start, end: kd_plot(
+        window(data["ka"], start, end), data["ka"].columns,
+        RADAR_COLORS, RADAR_SHADE, RADAR_LINESTYLES, ax=ax),
+    "kd_sbr": lambda data, ax, start, end: kd_plot(
+        window(data["sbr"], start, end), data["sbr"].columns,
+        SBR_COLORS, SBR_SHADE, SBR_LINESTYLES, ax=ax),
+}
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_panel(name, start, end, style=DEFAULT_STYLE):
+    """Renders a panel for the window [start, end] and returns PNG bytes.
+    Results are cached by (name, start, end, style).
+    :name: key in PANELS
+    :start: pandas.Timestamp
+    :end: pandas.Timestamp
+    :style: matplotlib style name
+    """
+    figsize = KDE_FIGSIZE if name.startswith("kd_") else PANEL_FIGSIZE
+    buffer = io.BytesIO()
+    with RENDER_LOCK, plt.style.context(style):
+        fig, ax = plt.subplots(figsize=figsize, constrained_layout=True)
+        try:
+            PANELS[name](DATA, ax, start, end)
+            if not name.startswith("kd_"):
+                ax.set_xlim(start, end)
+            fig.savefig(buffer, format="png")
+        finally:
+            plt.close(fig)
+    return buffer.getvalue()
+
+
+class PanelHandler(BaseHTTPRequestHandler):
+    """Serves /panel/<name>.png and a list of panels at /"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path in ("/", "/panels"):
+            self.send_text(200, "\n".join(sorted(PANELS)))
+            return
+
+        name = url.path.rsplit("/", 1)[-1].replace(".png", "")
+        if not url.path.startswith("/panel/") or name not in PANELS:
+            self.send_text(404, f"Unknown panel {name}")
+            return
+
+        query = parse_qs(url.query)
+        try:
+            start = pd.Timestamp(query.get("start", [XBEGIN])[0])
+            end = pd.Timestamp(query.get("end", [XEND])[0])
+        except ValueError as err:
+            self.send_text(400, f"Bad time window: {err}")
+            return
+        if pd.isna(start) or pd.isna(end):
+            self.send_text(400, "Bad time window: start and end must be times")
+            return
+        if start >= end:
+            self.send_text(400, f"Bad time window: start {start} is not "
+                                f"before end {end}")
+            return
+        style = query.get("style", [DEFAULT_STYLE])[0]
+        if style not in plt.style.available and style != DEFAULT_STYLE:
+            self.send_text(400, f"Unknown style {style}")
+            return
+
+        try:
+            png = render_panel(name, start, end, style=style)
+        except Exception as err:
+            self.send_text(500, f"Failed to render {name}: {err}")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(png)))
+        self.end_headers()
+        self.wfile.write(png)
+
+    def send_text(self, status, text):
+        body = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(host=HOST, port=PORT):
+    """Loads data and serves panels until interrupted"""
+    load_data()
+    server = ThreadingHTTPServer((host, port), PanelHandler)
+    print(f"Serving panels at http://{host}:{port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,170 @@
+"""Converts SBR calibrated brightness temperature files for all legs into a
+memory-mapped array store and selects data from it.
+
+The store is a directory with one set of .npy arrays per frequency:
+    <frequency>_angle.npy, <frequency>_time.npy, <frequency>_leg.npy,
+    <frequency>H.npy, <frequency>V.npy
+sorted by angle then time, and metadata.json with the leg time ranges.
+"""
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+FREQUENCIES = ["19", "89"]
+
+# Date, time, angle, H and V column positions in the calibrated files
+SBR_COLUMNS = {
+    "19": [0, 1, 4, 21, 22],
+    "89": [0, 1, 4, 22, 23],
+}
+SBR_FILE_PATTERN = re.compile(r"tb(?P<frequency>\d+)_leg(?P<leg>\d+)_calibrated\.txt")
+
+
+def read_sbr_file(path, frequency):
+    """Reads one SBR calibrated file and returns Tb for all angles"""
+    df = pd.read_csv(path,
+                     index_col="Date",
+                     parse_dates={"Date": [0, 1]},
+                     delim_whitespace=True,
+                     header=None,
+                     usecols=SBR_COLUMNS[frequency])
+    df.columns = ["angle", f"{frequency}H", f"{frequency}V"]
+    return df
+
+
+def sbr_files(sbr_path, frequency):
+    """Returns dict of leg number to file path for one frequency"""
+    files = {}
+    for path in sbr_path.glob(f"tb{frequency}_leg*_calibrated.txt"):
+        match = SBR_FILE_PATTERN.fullmatch(path.name)
+        if match:
+            files[int(match["leg"])] = path
+    return dict(sorted(files.items()))
+
+
+def convert(sbr_path, store_path, frequencies=FREQUENCIES):
+    """Parses SBR files for all legs and writes the array store
+    :sbr_path: directory containing tb<frequency>_leg<n>_calibrated.txt
+    :store_path: output directory
+    """
+    store_path.mkdir(parents=True, exist_ok=True)
+    metadata = {"frequencies": list(frequencies), "legs": {}}
+    for frequency in frequencies:
+        files = sbr_files(sbr_path, frequency)
+        if not files:
+            raise FileNotFoundError(f"No SBR files for {frequency} GHz "
+                                    f"in {sbr_path}")
+        dfs = [read_sbr_file(path, frequency).assign(leg=leg)
+               for leg, path in files.items()]
+        df = pd.concat(dfs)
+
+        time = df.index.values.astype("datetime64[ns]")
+        angle = df.angle.to_numpy(dtype=float)
+        order = np.lexsort((time, angle))
+        np.save(store_path / f"{frequency}_time.npy", time[order])
+        np.save(store_path / f"{frequency}_angle.npy", angle[order])
+        np.save(store_path / f"{frequency}_leg.npy",
+                df.leg.to_numpy(dtype=np.int16)[order])
+        for pol in ["H", "V"]:
+            np.save(store_path / f"{frequency}{pol}.npy",
+                    df[f"{frequency}{pol}"].to_numpy(dtype=float)[order])
+
+        metadata["legs"][frequency] = {
+            str(leg): [str(leg_df.index.min()), str(leg_df.index.max())]
+            for leg, leg_df in zip(files, dfs)}
+
+    with open(store_path / "metadata.json", "w") as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+def open_store(store_path):
+    """Returns metadata and memory-mapped arrays of the store"""
+    with open(store_path / "metadata.json") as f:
+        metadata = json.load(f)
+    arrays = {}
+    for frequency in metadata["frequencies"]:
+        for name in ["time", "angle", "leg"]:
+            arrays[f"{frequency}_{name}"] = np.load(
+                store_path / f"{frequency}_{name}.npy", mmap_mode="r")
+        for pol in ["H", "V"]:
+            arrays[f"{frequency}{pol}"] = np.load(
+                store_path / f"{frequency}{pol}.npy", mmap_mode="r")
+    return metadata, arrays
+
+
+def _time_slice(time, start, end, offset=0):
+    """Returns slice of sorted time array between start and end inclusive"""
+    i0 = 0 if start is None else np.searchsorted(
+        time, np.datetime64(pd.Timestamp(start), "ns"), side="left")
+    i1 = time.size if end is None else np.searchsorted(
+        time, np.datetime64(pd.Timestamp(end), "ns"), side="right")
+    return slice(offset + i0, offset + max(i0, i1))
+
+
+def select(store_path, frequency, angle=55, start=None, end=None, legs=None):
+    """Selects Tb for one frequency and angle from the store
+    :store_path: directory of the store
+    :frequency: frequency of data (19 or 89 GHz)
+    :angle: incidence angle
+    :start: start of time window, default is start of data
+    :end: end of time window, default is end of data
+    :legs: list of leg numbers, default is all legs
+
+    Returns pandas.DataFrame of H and V Tb with time index
+    """
+    metadata, arrays = open_store(store_path)
+    if frequency not in metadata["frequencies"]:
+        raise KeyError(f"No {frequency} GHz data in {store_path}")
+
+    angles = arrays[f"{frequency}_angle"]
+    a0 = np.searchsorted(angles, angle, side="left")
+    a1 = np.searchsorted(angles, angle, side="right")
+    rows = _time_slice(arrays[f"{frequency}_time"][a0:a1], start, end,
+                       offset=a0)
+
+    # Legs can overlap in time, so select them by the stored leg number
+    if legs is None:
+        keep = slice(None)
+    else:
+        keep = np.isin(arrays[f"{frequency}_leg"][rows], list(legs))
+
+    def take(name):
+        return np.asarray(arrays[name][rows][keep])
+
+    return pd.DataFrame({f"{frequency}H": take(f"{frequency}H"),
+                         f"{frequency}V": take(f"{frequency}V")},
+                        index=pd.DatetimeIndex(take(f"{frequency}_time"),
+                                               name="Date"))
+
+
+def is_stale(sbr_path, store_path, frequencies=FREQUENCIES):
+    """Returns True if the store is missing, does not have the same legs as
+    the SBR files on disk, or is older than any SBR file"""
+    metadata_file = store_path / "metadata.json"
+    if not metadata_file.exists():
+        return True
+    with open(metadata_file) as f:
+        metadata = json.load(f)
+    store_time = metadata_file.stat().st_mtime
+    for frequency in frequencies:
+        files = sbr_files(sbr_path, frequency)
+        stored_legs = metadata["legs"].get(frequency, {})
+        if set(map(str, files)) != set(stored_legs):
+            return True
+        if any(path.stat().st_mtime > store_time for path in files.values()):
+            return True
+    return False
+
+
+def main():
+    """Converts SBR files in the repository data directory"""
+    import reader  # reader imports this module to read the store
+    metadata = convert(reader.SBR_PATH, reader.SBR_STORE_PATH)
+    print(json.dumps(metadata, indent=2))
+
+
+if __name__ == "__main__":
+    main()
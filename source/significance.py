@@ -0,0 +1,135 @@
+"""Permutation and bootstrap tests of the shift in KuKa backscatter and SBR
+brightness temperature distributions between pre- and post-event periods"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import reader
+from plotting import PRE_EVENT, POST_EVENT
+
+QUANTILES = [0.1, 0.5, 0.9]
+STATISTICS = ["mean"] + [f"q{int(q*100):02d}" for q in QUANTILES] + ["ks"]
+N_RESAMPLE = 10000
+BATCH_SIZE = 1000  # resamples drawn per batch to bound memory
+CONFIDENCE = 0.95
+
+
+def _statistics(pre, post):
+    """Calculates post - pre difference in mean and quantiles, and the
+    Kolmogorov-Smirnov distance, for each row of pre and post
+    :pre: 2D array with one sample per row
+    :post: 2D array with one sample per row
+
+    Returns 2D array with one row per sample and one column per statistic
+    """
+    npre, npost = pre.shape[1], post.shape[1]
+    dmean = post.mean(axis=1) - pre.mean(axis=1)
+    dquantile = (np.quantile(post, QUANTILES, axis=1) -
+                 np.quantile(pre, QUANTILES, axis=1)).T
+
+    pooled = np.concatenate([pre, post], axis=1)
+    order = np.argsort(pooled, axis=1, kind="stable")
+    pooled = np.take_along_axis(pooled, order, axis=1)
+    is_pre = order < npre
+    cdf_diff = (np.cumsum(is_pre, axis=1) / npre -
+                np.cumsum(~is_pre, axis=1) / npost)
+    # Only compare ECDFs at the last of a run of tied values
+    run_end = np.ones_like(is_pre)
+    run_end[:, :-1] = pooled[:, 1:] != pooled[:, :-1]
+    ks = np.where(run_end, np.abs(cdf_diff), 0.).max(axis=1)
+
+    return np.column_stack([dmean, dquantile, ks])
+
+
+def _batches(n_resample):
+    """Yields batch sizes summing to n_resample"""
+    for start in range(0, n_resample, BATCH_SIZE):
+        yield min(BATCH_SIZE, n_resample - start)
+
+
+def channel_test(pre, post, n_resample=N_RESAMPLE, seed=None):
+    """Tests the difference between pre- and post-event samples of one
+    channel.  p-values come from permutations of the pooled sample and
+    confidence intervals from bootstrap resamples of each period.
+    :pre: 1D array of pre-event values
+    :post: 1D array of post-event values
+    :n_resample: number of permutation and bootstrap resamples
+    :seed: seed or numpy.random.SeedSequence for the random generator
+
+    Returns pandas.DataFrame indexed by statistic
+    """
+    pre = np.asarray(pre, dtype=float)
+    post = np.asarray(post, dtype=float)
+    pre, post = pre[np.isfinite(pre)], post[np.isfinite(post)]
+    npre = pre.size
+    if npre == 0 or post.size == 0:
+        return pd.DataFrame(np.nan, index=pd.Index(STATISTICS, name="statistic"),
+                            columns=["observed", "p_value", "ci_low", "ci_high"])
+
+    rng = np.random.default_rng(seed)
+    observed = _statistics(pre[np.newaxis, :], post[np.newaxis, :])[0]
+
+    pooled = np.concatenate([pre, post])
+    exceed = np.zeros(len(STATISTICS))
+    bootstrap = []
+    for nbatch in _batches(n_resample):
+        index = rng.random((nbatch, pooled.size)).argsort(axis=1)
+        permuted = _statistics(pooled[index[:, :npre]], pooled[index[:, npre:]])
+        exceed += (np.abs(permuted) >= np.abs(observed)).sum(axis=0)
+
+        bootstrap.append(_statistics(
+            pre[rng.integers(0, npre, (nbatch, npre))],
+            post[rng.integers(0, post.size, (nbatch, post.size))]))
+    bootstrap = np.concatenate(bootstrap)
+
+    alpha = (1. - CONFIDENCE) / 2.
+    ci_low, ci_high = np.quantile(bootstrap, [alpha, 1. - alpha], axis=0)
+    return pd.DataFrame({"observed": observed,
+                         "p_value": (exceed + 1.) / (n_resample + 1.),
+                         "ci_low": ci_low,
+                         "ci_high": ci_high},
+                        index=pd.Index(STATISTICS, name="statistic"))
+
+
+def _channel_test(args):
+    """Unpacks arguments for channel_test in a worker process"""
+    return channel_test(*args)
+
+
+def significance_tests(df, n_resample=N_RESAMPLE, max_workers=None, seed=0,
+                       pre_event=PRE_EVENT, post_event=POST_EVENT):
+    """Tests pre- vs post-event differences for every channel in df, one
+    channel per worker process
+    :df: pandas.DataFrame with time index and one column per channel
+    :n_resample: number of permutation and bootstrap resamples
+    :max_workers: number of worker processes
+    :seed: seed for the random generators, one independent stream is
+           spawned per channel
+
+    Returns pandas.DataFrame indexed by (channel, statistic)
+    """
+    seeds = np.random.SeedSequence(seed).spawn(len(df.columns))
+    args = [(df[chan][:pre_event].to_numpy(),
+             df[chan][post_event:].to_numpy(),
+             n_resample,
+             chan_seed)
+            for chan, chan_seed in zip(df.columns, seeds)]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(_channel_test, args))
+    return pd.concat(results, keys=df.columns, names=["channel"])
+
+
+def main():
+    """Runs significance tests for KuKa and SBR channels"""
+    kuka = reader.kukadata()
+    sbr = reader.mask_sbr19_antenna(reader.sbrdata())
+
+    results = pd.concat([significance_tests(kuka),
+                         significance_tests(sbr, seed=1)])
+    print(results.to_string())
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Thickness-weighted aggregation of snowpit layer observations"""
+import numpy as np
+import pandas as pd
+
+PIT_ID = "Device_Operation_ID"
+LAYER_TOP = "From snow height"
+LAYER_BOTTOM = "To snow height"
+LAYER_DENSITY = "Snow density (cutter)"
+LAYER_VARIABLES = ["Salinity [ppt]", "Snow density (cutter)"]
+LAYER_SWE = "layer SWE [mm]"
+
+
+def layer_thickness(layers, top=LAYER_TOP, bottom=LAYER_BOTTOM):
+    """Returns layer thickness (cm) from top and bottom snow heights"""
+    return layers[top] - layers[bottom]
+
+
+def segments(keys):
+    """Sorts keys into contiguous segments
+    :keys: 1D array of group labels, one per row
+
+    Returns sorted unique keys, the sort order of rows and the start index
+    of each segment in the sorted rows
+    """
+    codes, uniques = pd.factorize(keys, sort=True)
+    order = np.argsort(codes, kind="stable")
+    starts = np.flatnonzero(np.diff(codes[order], prepend=-1))
+    return uniques, order, starts
+
+
+def segment_sum(keys, values, groups=None):
+    """Sums rows of values for each key using sorted-segment reductions
+    :keys: 1D array of group labels, one per row
+    :values: 1D or 2D array of values
+    :groups: (uniques, order, starts) returned by segments(keys), computed
+             from keys if not given
+
+    Returns sorted unique keys and sums with one row per key
+    """
+    if groups is None: groups = segments(keys)
+    uniques, order, starts = groups
+    values = np.asarray(values, dtype=float)
+    if starts.size == 0:
+        return uniques, np.zeros((0,) + values.shape[1:])
+    return uniques, np.add.reduceat(values[order], starts, axis=0)
+
+
+def weighted_layer_means(layers, variables=LAYER_VARIABLES, by=PIT_ID,
+                         weight="thickness", groups=None):
+    """Returns thickness-weighted means of layer variables for each pit.
+    Layers with a missing value do not contribute to the mean of that
+    variable.
+    :layers: pandas.DataFrame with one row per layer
+    :variables: columns to average
+    :by: column identifying the pit
+    :weight: column containing layer thickness
+    :groups: segments of the by column, see segment_sum
+    """
+    values = layers[variables].to_numpy(dtype=float)
+    weights = np.nan_to_num(layers[weight].to_numpy(dtype=float))[:, np.newaxis]
+    weights = np.where(np.isfinite(values), weights, 0.)
+    pits, sums = segment_sum(layers[by].to_numpy(),
+                             np.hstack([np.nan_to_num(values) * weights,
+                                        weights]),
+                             groups=groups)
+    nvar = len(variables)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(sums[:, nvar:] > 0,
+                         sums[:, :nvar] / sums[:, nvar:],
+                         np.nan)
+    return pd.DataFrame(means, index=pd.Index(pits, name=by), columns=variables)
+
+
+def layer_swe(layers, density=LAYER_DENSITY, by=PIT_ID, weight="thickness",
+              groups=None):
+    """Returns snow water equivalent (mm) for each pit integrated from layer
+    density (kg/m3) and thickness (cm).  Layers without a density are
+    skipped.
+    """
+    swe = np.nan_to_num(layers[density].to_numpy(dtype=float) *
+                        layers[weight].to_numpy(dtype=float)) / 100.
+    pits, sums = segment_sum(layers[by].to_numpy(), swe, groups=groups)
+    return pd.Series(sums, index=pd.Index(pits, name=by), name=LAYER_SWE)
+
+
+def aggregate_pits(layers, variables=LAYER_VARIABLES, by=PIT_ID):
+    """Aggregates snowpit layers into bulk properties for each pit
+    :layers: pandas.DataFrame with one row per layer
+
+    Returns a pandas.DataFrame indexed by pit containing Location,
+    thickness-weighted means of variables, total sampled thickness and
+    layer SWE
+    """
+    layers = layers.assign(thickness=layer_thickness(layers))
+    keys = layers[by].to_numpy()
+    groups = segments(keys)
+    _, order, starts = groups
+    thickness = segment_sum(keys, layers.thickness, groups=groups)[1]
+    bulk = weighted_layer_means(layers, variables=variables, by=by,
+                                groups=groups)
+    bulk.insert(0, "Location", layers["Location"].to_numpy()[order][starts])
+    bulk["thickness"] = thickness
+    bulk[LAYER_SWE] = layer_swe(layers, by=by, groups=groups)
+    return bulk
+